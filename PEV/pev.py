@@ -1,5 +1,7 @@
 import os
-from typing import List, TypedDict, Optional
+import sys
+import operator
+from typing import Annotated, List, TypedDict, Optional
 from dotenv import load_dotenv
 import json
 from langchain_groq import ChatGroq
@@ -9,6 +11,11 @@ from langgraph.graph import StateGraph, END
 from rich.console import Console
 from rich.markdown import Markdown
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.batching import StructuredBatcher
+from common.plan_library import PlanLibrary
+from common.profiling import profile_state
+
 load_dotenv()
 llm = ChatGroq(model="llama-3.3-70b-versatile", temperature=0)
 console = Console()
@@ -31,26 +38,39 @@ class VerificationResult(BaseModel):
     is_successful: bool = Field(description="True if the tool execution was successful and the data is valid.")
     reasoning: str = Field(description="Reasoning for the verfication decision.")
 
+verification_batcher = StructuredBatcher(llm, VerificationResult)
+
 class PEVState(TypedDict):
     user_input: str
     plan: Optional[List[str]]
+    step_index: int
+    plan_template: Optional[str]
     last_tool_result: Optional[str]
-    intermediate_steps: List[str]
+    intermediate_steps: Annotated[List[str], operator.add]
     final_answer: Optional[str]
     retries: int
 
 class Plan(BaseModel):
     steps: List[str] = Field(description="List of queries (max 5).", max_length=5)
 
+plan_library = PlanLibrary(os.path.join(os.path.dirname(os.path.abspath(__file__)), "plan_library.json"))
+
 def planner_node(state: PEVState):
     retries = state.get("retries", 0)
     if retries > 3:
         console.print("--- (PEV) PLANNER: Retry limit reached. Stopping. ---")
         return {
             "plan": [],
+            "step_index": 0,
             "final_answer": "Error: Unable to complete task after multiple retries."
         }
     
+    if retries == 0:
+        template_key, steps = plan_library.lookup(state['user_input'])
+        if steps is not None:
+            console.print(f"--- (PEV) PLANNER: Reusing verified plan from library: {steps} ---")
+            return {'plan': steps, 'step_index': 0, 'plan_template': template_key, "retries": retries + 1}
+
     console.print(f"--- (PEV) PLANNER: Creating/revising plan (retry {retries})... ---")
     planner_llm = llm.with_structured_output(Plan)
     past_context = "\n".join(state['intermediate_steps'])
@@ -69,40 +89,43 @@ def planner_node(state: PEVState):
     {past_context}
     """
     plan = planner_llm.invoke(base_prompt)
-    return {'plan': plan.steps, "retries": retries + 1}
+    return {'plan': plan.steps, 'step_index': 0, 'plan_template': None, "retries": retries + 1}
 
 def excutor_node(state: PEVState):
-    if not state['plan']:
+    if state['step_index'] >= len(state['plan']):
         console.print("--- (PEV) EXECUTOR: No steps left, skipping execution. ---")
         return {}
     console.print("--- EXECUTOR: Running next steps... ---")
-    next_step = state['plan'][0]
+    next_step = state['plan'][state['step_index']]
     result = flaky_web_search(next_step)
-    return {'plan': state['plan'][1:], "last_tool_result": result}
+    return {'step_index': state['step_index'] + 1, "last_tool_result": result}
 
 def verifier_node(state: PEVState):
     console.print("--- VERIFIER: Checking last tool result... ---")
-    verifier_llm = llm.with_structured_output(VerificationResult)
     prompt = f"Verify if the following tool output is a successful result or an error message. The task was '{state['user_input']}'.\n\nTool Output: '{state['last_tool_result']}'"
-    verification = verifier_llm.invoke(prompt)
+    verification = verification_batcher.invoke(prompt)
     console.print(f"--- VERIFIER: Judgment is '{'Success' if verification.is_successful else 'Failure'}' ---")
     if verification.is_successful:
-        return {'intermediate_steps': state['intermediate_steps'] + [state['last_tool_result']]}
+        return {'intermediate_steps': [state['last_tool_result']]}
     else:
-        return {"plan": [], "intermediate_steps": state["intermediate_steps"] + [f"Verification Failed: {state['last_tool_result']}"]}
+        if state.get('plan_template'):
+            plan_library.record_outcome(state['user_input'], state['plan'], False, state['plan_template'])
+        return {"step_index": len(state['plan']), "plan_template": None, "intermediate_steps": [f"Verification Failed: {state['last_tool_result']}"]}
 
 def synthesizer_node(state: PEVState):
     console.print("--- (Basic) SYNTHESIZER: Generating final answer... ---")
     context = "\n".join(state["intermediate_steps"])
     prompt = f"Synthesize an answer for '{state['user_input']}' using this data:\n{context}"
     answer = llm.invoke(prompt).content
+    verified = not state.get("final_answer") and bool(state["intermediate_steps"]) and "Verification Failed" not in state["intermediate_steps"][-1]
+    plan_library.record_outcome(state['user_input'], state['plan'], verified, state.get('plan_template'))
     return {"final_answer": answer}
 
 def router(state: PEVState):
     if state.get("final_answer"):
         console.print("--- ROUTER: Final answer available. Moving to synthesizer. ---")
         return "synthesize"
-    if not state['plan']:
+    if state['step_index'] >= len(state['plan']):
         if state["intermediate_steps"] and "Verification Failed" in state["intermediate_steps"][-1]:
             console.print("--- ROUTER: Verification failed. Re-planning... ---")
             return "plan"
@@ -130,6 +153,10 @@ pev_agent_app = pev_graph_builder.compile()
 if __name__ == "__main__":
     user_query = input("Enter your query: ")
     initial_input = {"user_input": user_query, "intermediate_steps": [], "retries": 0}
-    final_output = pev_agent_app.invoke(initial_input)
+    if os.getenv("PROFILE_STATE"):
+        final_output, _ = profile_state(pev_agent_app, initial_input)
+    else:
+        final_output = pev_agent_app.invoke(initial_input)
     console.print("\n--- [bold green]Final Output from PEV Agent[/bold green] ---")
     console.print(Markdown(final_output['final_answer']))
+    console.print(f"\n--- [bold cyan]Plan Library Stats[/bold cyan]: {plan_library.summary()} ---")
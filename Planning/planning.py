@@ -1,4 +1,7 @@
+import os
 import re
+import sys
+import operator
 from typing import List, Annotated, Optional, TypedDict
 from dotenv import load_dotenv
 from langchain_groq import ChatGroq
@@ -10,6 +13,10 @@ from langgraph.graph import StateGraph, END
 from rich.console import Console
 from rich.markdown import Markdown
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.plan_library import PlanLibrary
+from common.profiling import profile_state
+
 load_dotenv()
 console = Console()
 
@@ -31,10 +38,19 @@ class Plan(BaseModel):
 class PlanningState(TypedDict):
     user_request: str
     plan: Optional[List[str]]
-    intermediate_steps: List[ToolMessage]
+    step_index: int
+    plan_template: Optional[str]
+    intermediate_steps: Annotated[List[ToolMessage], operator.add]
     final_answer: Optional[str]
 
+plan_library = PlanLibrary(os.path.join(os.path.dirname(os.path.abspath(__file__)), "plan_library.json"))
+
 def planner_node(state: PlanningState):
+    template_key, steps = plan_library.lookup(state['user_request'])
+    if steps is not None:
+        console.print(f"---PLANNER: Reusing plan from library: {steps}")
+        return {'plan': steps, 'step_index': 0, 'plan_template': template_key}
+
     console.print("---.PLANNER: Decomposing task... ---")
     planner_llm = llm.with_structured_output(Plan)
     prompt = f"""You are an expert planner. Your job is to create a step-by-step plan to answer the user's request.
@@ -58,12 +74,17 @@ def planner_node(state: PlanningState):
     """
     plan_result = planner_llm.invoke(prompt)
     console.print(f"---PLANNER: Generated Plan: {plan_result.steps}")
-    return {'plan': plan_result.steps}
+    return {'plan': plan_result.steps, 'step_index': 0, 'plan_template': None}
+
+def search_succeeded(result) -> bool:
+    """A search step counts as verified only if it returned results and no error payload."""
+    if isinstance(result, dict):
+        return not result.get("error") and bool(result.get("results"))
+    return bool(result) and not str(result).strip().lower().startswith("error")
 
 def executor_node(state: PlanningState):
     console.print("EXCUTOR: Running next step... ---")
-    plan = state['plan']
-    next_step = plan[0]
+    next_step = state['plan'][state['step_index']]
     match = re.search(r"(\w+)\((?:\'|\")(.*?)(?:\'|\")\)", next_step)
     if not match:
         tool_name = "web_search"
@@ -77,11 +98,12 @@ def executor_node(state: PlanningState):
     tool_message = ToolMessage(
         content=str(result),
         name=tool_name,
-        tool_call_id=f"manual-{hash(query)}"
+        tool_call_id=f"manual-{hash(query)}",
+        status="success" if search_succeeded(result) else "error"
     )
     return {
-        'plan': plan[1:],
-        "intermediate_steps": state["intermediate_steps"] + [tool_message]
+        'step_index': state['step_index'] + 1,
+        "intermediate_steps": [tool_message]
     }
 
 def synthesizer_node(state: PlanningState):
@@ -94,10 +116,12 @@ def synthesizer_node(state: PlanningState):
     {context}
     """
     final_answer = llm.invoke(prompt).content
+    success = bool(state['intermediate_steps']) and all(msg.status == "success" for msg in state['intermediate_steps'])
+    plan_library.record_outcome(state['user_request'], state['plan'], success, state.get('plan_template'))
     return {"final_answer": final_answer}
 
 def planning_router(state: PlanningState):
-    if not state['plan']:
+    if state['step_index'] >= len(state['plan']):
         console.print("--- ROUTER: Plan complete. Moving to synthesizer. ---")
         return "synthesize"
     else:
@@ -122,6 +146,10 @@ if __name__ == "__main__":
 
     initial_input = {"user_request": user_input, "intermediate_steps": []}
 
-    final_planning_output = planner_agent_app.invoke(initial_input)
+    if os.getenv("PROFILE_STATE"):
+        final_planning_output, _ = profile_state(planner_agent_app, initial_input)
+    else:
+        final_planning_output = planner_agent_app.invoke(initial_input)
     console.print("\n--- [bold green]Final Output from Planning Agent[/bold green] ---")
     console.print(Markdown(final_planning_output['final_answer']))
+    console.print(f"\n--- [bold cyan]Plan Library Stats[/bold cyan]: {plan_library.summary()} ---")
@@ -1,4 +1,5 @@
 import os
+import sys
 import json
 from typing import TypedDict, List, Optional
 from dotenv import load_dotenv
@@ -9,6 +10,9 @@ from rich.console import Console
 from rich.markdown import Markdown
 from rich.syntax import Syntax
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.batching import StructuredBatcher
+
 # Load environment variables
 load_dotenv()
 os.environ["LANGCHAIN_TRACING_V2"] = "true"
@@ -45,6 +49,9 @@ class RefectionState(TypedDict):
 
 llm = ChatGroq(model="llama-3.3-70b-versatile", temperature=0.2)
 
+critic_batcher = StructuredBatcher(llm, Critique)
+refiner_batcher = StructuredBatcher(llm, RefinedCode)
+
 # --- Graph Nodes ---
 
 def generator_node(state):
@@ -59,7 +66,6 @@ def generator_node(state):
 
 def critic_node(state):
     console.print("--- 2. Critiquing Draft ---")
-    critic_llm = llm.with_structured_output(Critique)
     code_to_critique = state['draft']['code']
     prompt = f"""You are an expert code reviewer and senior Python developer. Your task is to perform a thorough critique of the following code.
     
@@ -74,12 +80,11 @@ def critic_node(state):
     {code_to_critique}
     ```
     """
-    critique = critic_llm.invoke(prompt)
+    critique = critic_batcher.invoke(prompt)
     return {"critique": critique.model_dump()}
 
 def refiner_node(state):
     console.print("--- 3. Refined Code ---")
-    refiner_llm = llm.with_structured_output(RefinedCode)
     draft_code = state['draft']['code']
     critique_suggestions = json.dumps(state['critique'], indent=2)
     prompt = f"""
@@ -106,7 +111,7 @@ def refiner_node(state):
         refinement_summary
         """
 
-    refined_code = refiner_llm.invoke(prompt)
+    refined_code = refiner_batcher.invoke(prompt)
     return {'refined_code': refined_code.model_dump()}
 
 # --- Graph Construction ---
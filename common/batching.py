@@ -0,0 +1,137 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import List
+
+from pydantic import Field, create_model
+from rich.console import Console
+
+console = Console()
+
+class StructuredBatcher:
+    """Collects concurrent structured-output calls for one schema and answers them with a single LLM request.
+
+    A call that arrives while the batcher is idle goes straight to the model, so a lone run pays no batching delay.
+    Calls that arrive while another is in flight are queued and sent together after `max_wait` seconds, or as soon
+    as `max_batch_size` are waiting.
+    """
+
+    def __init__(self, llm, schema, max_batch_size: int = 8, max_wait: float = 0.05):
+        self.schema = schema
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.single_llm = llm.with_structured_output(schema)
+        item_schema = create_model(
+            f"{schema.__name__}BatchItem",
+            __base__=schema,
+            task_id=(int, Field(description="The id of the task this result answers.")),
+        )
+        batch_schema = create_model(
+            f"{schema.__name__}Batch",
+            items=(List[item_schema], Field(description="One result per task, each tagged with its task id.")),
+        )
+        self.batch_llm = llm.with_structured_output(batch_schema)
+        self.lock = threading.Lock()
+        self.pending = []
+        self.in_flight = 0
+        self.timer = None
+
+    def invoke(self, prompt: str):
+        if self._claim_direct():
+            try:
+                return self.single_llm.invoke(prompt)
+            finally:
+                self._release()
+        return self._submit(prompt).result()
+
+    async def ainvoke(self, prompt: str):
+        if self._claim_direct():
+            try:
+                return await self.single_llm.ainvoke(prompt)
+            finally:
+                self._release()
+        return await asyncio.wrap_future(self._submit(prompt))
+
+    def _claim_direct(self) -> bool:
+        with self.lock:
+            if self.pending or self.in_flight:
+                return False
+            self.in_flight += 1
+            return True
+
+    def _release(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def _submit(self, prompt: str) -> Future:
+        future = Future()
+        with self.lock:
+            self.pending.append((prompt, future))
+            if len(self.pending) >= self.max_batch_size:
+                self._dispatch()
+            elif self.timer is None:
+                self.timer = threading.Timer(self.max_wait, self._flush)
+                self.timer.daemon = True
+                self.timer.start()
+        return future
+
+    def _flush(self):
+        with self.lock:
+            self._dispatch()
+
+    def _dispatch(self):
+        # Must be called with the lock held.
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if batch:
+            self.in_flight += 1
+            threading.Thread(target=self._run, args=(batch,), daemon=True).start()
+
+    def _run(self, batch):
+        try:
+            prompts = [prompt for prompt, _ in batch]
+            results = self._run_combined(prompts) if len(prompts) > 1 else None
+            if results is None:
+                # Fall back to one call per prompt if the combined response is unusable.
+                results = self.single_llm.batch(prompts, return_exceptions=True)
+            for (_, future), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        except Exception as error:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+        finally:
+            self._release()
+
+    def _run_combined(self, prompts: List[str]):
+        """Returns results in prompt order, or None unless every task id comes back exactly once."""
+        console.print(f"--- BATCHER: Sending {len(prompts)} requests as one LLM call ---")
+        try:
+            items = self.batch_llm.invoke(self._combine(prompts)).items
+        except Exception:
+            return None
+        by_id = {}
+        for item in items:
+            if item.task_id in by_id:
+                return None
+            by_id[item.task_id] = item
+        if set(by_id) != set(range(1, len(prompts) + 1)):
+            return None
+        return [
+            self.schema(**by_id[task_id].model_dump(exclude={"task_id"}))
+            for task_id in range(1, len(prompts) + 1)
+        ]
+
+    @staticmethod
+    def _combine(prompts: List[str]) -> str:
+        tasks = "\n\n".join(f"### Task {task_id}\n{prompt}" for task_id, prompt in enumerate(prompts, start=1))
+        return (
+            f"You will receive {len(prompts)} independent tasks, numbered 1 to {len(prompts)}. Complete each task "
+            f"on its own and return exactly one result per task in the `items` list, setting `task_id` to the "
+            f"number of the task it answers.\n\n{tasks}"
+        )
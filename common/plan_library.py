@@ -0,0 +1,161 @@
+import os
+import re
+import json
+import tempfile
+import threading
+import warnings
+from itertools import combinations
+from typing import List, Optional
+
+ENTITY_PATTERN = re.compile(
+    r"(?<!\w)\"[^\"]+\"(?!\w)|(?<!\w)'[^']+'(?!\w)|\b\d[\d.,]*\b|\b[A-Z][\w&.-]*(?:\s+[A-Z][\w&.-]*)*"
+)
+SLOT_PATTERN = re.compile(r"<slot(\d+)>")
+NON_ENTITY_WORDS = {
+    "what", "who", "whom", "which", "when", "where", "why", "how", "is", "are", "was", "were",
+    "do", "does", "did", "can", "could", "should", "would", "will", "compare", "find", "get",
+    "give", "tell", "list", "show", "search", "explain", "describe", "summarize", "the", "a", "an",
+    "and", "or", "of", "in", "on", "for", "to", "i", "me", "please",
+}
+MAX_LOOKUP_ENTITIES = 8
+
+def extract_entities(request: str) -> List[str]:
+    """Returns the entities (proper nouns, quoted strings, numbers) found in a request, in order."""
+    entities = []
+    request_start = len(request) - len(request.lstrip())
+    for match in ENTITY_PATTERN.finditer(request):
+        text = match.group(0)
+        quoted = text[0] in "\"'"
+        words = text[1:-1].split() if quoted else text.split()
+        # The sentence-initial word is capitalized for grammar, not because it names something.
+        if not quoted and match.start() == request_start:
+            words = words[1:]
+        # Drop leading question/command words such as "What" or "Compare".
+        while words and words[0].lower() in NON_ENTITY_WORDS:
+            words.pop(0)
+        entity = " ".join(words).rstrip(".,")
+        if entity and entity not in entities:
+            entities.append(entity)
+    return entities
+
+def entity_pattern(entity: str) -> str:
+    # Whole tokens only, so "5" does not match inside "2025" or "5.5", and "Meta" not inside "Metaverse".
+    return rf"(?<![\w.])(?<!\d\.){re.escape(entity)}(?!\w)(?!\.\d)"
+
+def to_template(text: str, entities: List[str]) -> str:
+    """Replaces every whole-token occurrence of an entity in `text` with a `<slotN>` placeholder."""
+    for index, entity in sorted(enumerate(entities), key=lambda item: -len(item[1])):
+        text = re.sub(entity_pattern(entity), f"<slot{index}>", text)
+    return text
+
+def fill_template(template: str, entities: List[str]) -> str:
+    return SLOT_PATTERN.sub(lambda match: entities[int(match.group(1))], template)
+
+def request_key(request: str, slot_entities: List[str]) -> str:
+    """Normalizes a request with only `slot_entities` turned into slots; every other entity stays literal."""
+    template = to_template(request, slot_entities).lower()
+    template = re.sub(r"[^\w<>\s]", " ", template)
+    return " ".join(template.split())
+
+def slot_entities_for(entities: List[str], steps: List[str]) -> List[str]:
+    """Only entities that the plan actually uses become slots."""
+    return [entity for entity in entities if any(re.search(entity_pattern(entity), step) for step in steps)]
+
+class PlanLibrary:
+    """Stores plans from verified runs as templates and reuses them for structurally similar requests.
+
+    One library is shared by every run in the process, so all reads and writes of the templates and counters go
+    through `self.lock`.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.templates = {}
+        self.stats = {"hits": 0, "misses": 0}
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.version = 0
+        self.saved_version = 0
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+                self.templates = data["templates"]
+                self.stats = data["stats"]
+            except (OSError, ValueError, KeyError, TypeError):
+                warnings.warn(f"Plan library at {path} is unreadable; starting with an empty library.")
+                self.templates = {}
+                self.stats = {"hits": 0, "misses": 0}
+
+    def lookup(self, request: str):
+        """Returns `(template_key, steps)` for a matching template, or `(None, None)` on a miss."""
+        entities = extract_entities(request)[:MAX_LOOKUP_ENTITIES]
+        # Any subset of the entities may be the slots, so try the candidate keys with the most slots first.
+        candidates = [
+            (request_key(request, list(slot_entities)), list(slot_entities))
+            for size in range(len(entities), -1, -1)
+            for slot_entities in combinations(entities, size)
+        ]
+        with self.lock:
+            self.version += 1
+            for key, slot_entities in candidates:
+                entry = self.templates.get(key)
+                if entry is not None and entry["failures"] <= entry["successes"]:
+                    self.stats["hits"] += 1
+                    steps = list(entry["steps"])
+                    break
+            else:
+                self.stats["misses"] += 1
+                return None, None
+        return key, [fill_template(step, slot_entities) for step in steps]
+
+    def record_outcome(self, request: str, steps: List[str], success: bool, template_key: Optional[str] = None):
+        """Records the outcome of a plan and saves the library. LLM-generated plans are only stored when they succeed."""
+        templated_steps = None
+        if template_key is None and success:
+            slot_entities = slot_entities_for(extract_entities(request), steps)
+            template_key = request_key(request, slot_entities)
+            templated_steps = [to_template(step, slot_entities) for step in steps]
+        with self.lock:
+            self.version += 1
+            if templated_steps is not None:
+                entry = self.templates.get(template_key)
+                # A newly verified plan replaces a stored template that has different steps.
+                if entry is None or entry["steps"] != templated_steps:
+                    self.templates[template_key] = {"steps": templated_steps, "successes": 0, "failures": 0}
+            entry = self.templates.get(template_key) if template_key is not None else None
+            if entry is not None:
+                entry["successes" if success else "failures"] += 1
+        self.save()
+
+    def summary(self) -> dict:
+        with self.lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                "templates": len(self.templates),
+                "hits": self.stats["hits"],
+                "misses": self.stats["misses"],
+                "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+                "plan_successes": sum(entry["successes"] for entry in self.templates.values()),
+                "plan_failures": sum(entry["failures"] for entry in self.templates.values()),
+            }
+
+    def save(self):
+        """Writes a snapshot of the library atomically, so a crash mid-write never leaves a truncated file behind."""
+        with self.lock:
+            snapshot = json.dumps({"templates": self.templates, "stats": self.stats}, indent=2)
+            version = self.version
+        with self.save_lock:
+            # A concurrent save may already have written a newer snapshot.
+            if version < self.saved_version:
+                return
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".plan_library-", suffix=".json")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    f.write(snapshot)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+            self.saved_version = version
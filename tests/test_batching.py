@@ -0,0 +1,101 @@
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from pydantic import BaseModel
+
+from common.batching import StructuredBatcher
+
+TASK_PATTERN = re.compile(r"### Task (\d+)\n(.*?)(?=\n\n### Task |\Z)", re.S)
+
+
+class Echo(BaseModel):
+    text: str
+
+
+class StubStructuredLLM:
+    def __init__(self, owner, schema):
+        self.owner = owner
+        self.schema = schema
+
+    def invoke(self, prompt):
+        if "items" not in self.schema.model_fields:
+            self.owner.single_calls.append(prompt)
+            self.owner.single_started.set()
+            self.owner.release.wait(timeout=5)
+            return Echo(text=prompt)
+        self.owner.combined_calls.append(prompt)
+        tasks = [(int(task_id), text) for task_id, text in TASK_PATTERN.findall(prompt)]
+        item_schema = self.schema.model_fields["items"].annotation.__args__[0]
+        items = [item_schema(task_id=task_id, text=text) for task_id, text in self.owner.respond(tasks)]
+        return self.schema(items=items)
+
+    def batch(self, prompts, return_exceptions=False):
+        self.owner.fallback_calls.append(prompts)
+        return [Echo(text=prompt) for prompt in prompts]
+
+
+class StubLLM:
+    def __init__(self, respond=lambda tasks: list(reversed(tasks))):
+        self.respond = respond
+        self.single_calls = []
+        self.combined_calls = []
+        self.fallback_calls = []
+        self.single_started = threading.Event()
+        self.release = threading.Event()
+
+    def with_structured_output(self, schema):
+        return StubStructuredLLM(self, schema)
+
+
+def run_concurrently(llm, count):
+    """Keeps one direct call in flight so that `count` concurrent calls are queued into a batch."""
+    batcher = StructuredBatcher(llm, Echo, max_batch_size=count, max_wait=1.0)
+    with ThreadPoolExecutor(count + 1) as pool:
+        blocker = pool.submit(batcher.invoke, "blocker")
+        assert llm.single_started.wait(timeout=5)
+        prompts = [f"prompt {index}" for index in range(count)]
+        results = list(pool.map(batcher.invoke, prompts))
+        llm.release.set()
+        assert blocker.result().text == "blocker"
+    return prompts, results
+
+
+def test_lone_call_goes_directly_to_model():
+    llm = StubLLM()
+    llm.release.set()
+    batcher = StructuredBatcher(llm, Echo)
+
+    assert batcher.invoke("only").text == "only"
+    assert llm.single_calls == ["only"]
+    assert llm.combined_calls == []
+
+
+def test_concurrent_calls_share_one_combined_request_routed_by_task_id():
+    llm = StubLLM()
+
+    prompts, results = run_concurrently(llm, 5)
+
+    assert len(llm.combined_calls) == 1
+    assert llm.fallback_calls == []
+    assert [result.text for result in results] == prompts
+    assert all(type(result) is Echo for result in results)
+
+
+def test_duplicate_task_ids_fall_back_to_per_prompt_calls():
+    llm = StubLLM(respond=lambda tasks: [(1, text) for _, text in tasks])
+
+    prompts, results = run_concurrently(llm, 4)
+
+    assert len(llm.combined_calls) == 1
+    assert len(llm.fallback_calls) == 1
+    assert [result.text for result in results] == prompts
+
+
+def test_missing_task_id_falls_back_to_per_prompt_calls():
+    llm = StubLLM(respond=lambda tasks: tasks[:-1])
+
+    prompts, results = run_concurrently(llm, 3)
+
+    assert len(llm.fallback_calls) == 1
+    assert [result.text for result in results] == prompts
@@ -0,0 +1,121 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from common.plan_library import PlanLibrary, extract_entities, to_template
+
+
+def test_reused_plan_keeps_numbers_and_substrings_intact(tmp_path):
+    library = PlanLibrary(str(tmp_path / "plan_library.json"))
+    library.record_outcome(
+        "Top 5 products of Meta",
+        ["Meta top 5 products 2025", "Meta metaverse spending", "main AI revenue of Meta"],
+        success=True,
+    )
+
+    key, steps = library.lookup("Top 10 products of Google")
+
+    assert key is not None
+    assert steps == ["Google top 10 products 2025", "Google metaverse spending", "main AI revenue of Google"]
+
+
+def test_to_template_only_replaces_whole_tokens():
+    assert to_template("AI in main 5.5 and 2025, AI.", ["AI", "5"]) == "<slot0> in main 5.5 and 2025, <slot0>."
+
+
+def test_extract_entities_skips_question_words():
+    assert extract_entities("What is the revenue and headcount of Apple?") == ["Apple"]
+
+
+def test_failed_llm_plan_is_not_stored(tmp_path):
+    library = PlanLibrary(str(tmp_path / "plan_library.json"))
+    library.record_outcome("Revenue of Apple", ["Apple revenue"], success=False)
+
+    assert library.lookup("Revenue of Google") == (None, None)
+
+
+def test_template_with_more_failures_than_successes_is_not_served(tmp_path):
+    library = PlanLibrary(str(tmp_path / "plan_library.json"))
+    library.record_outcome("Revenue of Apple", ["Apple revenue"], success=True)
+    key, _ = library.lookup("Revenue of Google")
+    library.record_outcome("Revenue of Google", ["Google revenue"], success=False, template_key=key)
+    library.record_outcome("Revenue of Google", ["Google revenue"], success=False, template_key=key)
+
+    assert library.lookup("Revenue of Nvidia") == (None, None)
+    assert library.summary()["plan_failures"] == 2
+
+
+def test_lookup_does_not_write_to_disk(tmp_path):
+    path = tmp_path / "plan_library.json"
+    library = PlanLibrary(str(path))
+    library.lookup("Revenue of Apple")
+
+    assert not path.exists()
+
+
+def test_stats_are_saved_with_outcomes_and_reloaded(tmp_path):
+    path = tmp_path / "plan_library.json"
+    library = PlanLibrary(str(path))
+    library.lookup("Revenue of Apple")
+    library.record_outcome("Revenue of Apple", ["Apple revenue"], success=True)
+
+    reloaded = PlanLibrary(str(path))
+
+    assert reloaded.summary()["misses"] == 1
+    assert reloaded.lookup("Revenue of Google")[1] == ["Google revenue"]
+    assert [p.name for p in tmp_path.iterdir()] == ["plan_library.json"]
+
+
+def test_corrupt_library_file_starts_empty(tmp_path):
+    path = tmp_path / "plan_library.json"
+    path.write_text('{"templates": {"revenue of <slot0>": {"steps"')
+
+    with pytest.warns(UserWarning, match="unreadable"):
+        library = PlanLibrary(str(path))
+
+    assert library.summary()["templates"] == 0
+    library.record_outcome("Revenue of Apple", ["Apple revenue"], success=True)
+    assert json.loads(path.read_text())["stats"] == {"hits": 0, "misses": 0}
+
+
+def test_requests_differing_only_in_first_word_do_not_share_a_template(tmp_path):
+    library = PlanLibrary(str(tmp_path / "plan_library.json"))
+    library.record_outcome("Revenue of Apple", ["Apple revenue 2024"], success=True)
+
+    assert library.lookup("Headcount of Google") == (None, None)
+    assert library.lookup("Revenue of Google")[1] == ["Google revenue 2024"]
+
+
+def test_entities_missing_from_the_plan_stay_literal(tmp_path):
+    library = PlanLibrary(str(tmp_path / "plan_library.json"))
+    library.record_outcome("What is the revenue of Apple in Europe?", ["Apple revenue"], success=True)
+
+    assert library.lookup("What is the revenue of Google in Asia?") == (None, None)
+    assert library.lookup("What is the revenue of Google in Europe?")[1] == ["Google revenue"]
+
+
+def test_possessive_is_not_a_quoted_entity(tmp_path):
+    assert extract_entities("What's Apple's revenue and headcount?") == ["Apple"]
+
+    library = PlanLibrary(str(tmp_path / "plan_library.json"))
+    library.record_outcome("What's Apple's revenue and headcount?", ["Apple revenue", "Apple headcount"], success=True)
+
+    assert library.lookup("What's Google's revenue and headcount?")[1] == ["Google revenue", "Google headcount"]
+
+
+def test_concurrent_runs_share_one_library(tmp_path):
+    path = tmp_path / "plan_library.json"
+    library = PlanLibrary(str(path))
+
+    def run(index):
+        library.lookup(f"Revenue of Company{index}")
+        library.record_outcome(f"Revenue of Company{index} in Region{index}", [f"Company{index} revenue"], success=True)
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(run, range(200)))
+
+    summary = library.summary()
+    assert summary["hits"] + summary["misses"] == 200
+    assert summary["plan_successes"] == 200
+    assert PlanLibrary(str(path)).summary() == summary
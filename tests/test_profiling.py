@@ -0,0 +1,33 @@
+import operator
+from typing import Annotated, List, TypedDict
+
+from langgraph.graph import StateGraph, END
+
+from common.profiling import profile_state
+
+
+class CounterState(TypedDict):
+    step_index: int
+    items: Annotated[List[str], operator.add]
+
+
+def build_app(steps):
+    def append_node(state: CounterState):
+        return {"step_index": state["step_index"] + 1, "items": ["x" * 100]}
+
+    builder = StateGraph(CounterState)
+    builder.add_node("append", append_node)
+    builder.set_entry_point("append")
+    builder.add_conditional_edges("append", lambda state: "append" if state["step_index"] < steps else END)
+    return builder.compile()
+
+
+def test_profile_state_reports_every_superstep():
+    final_state, report = profile_state(build_app(3), {"step_index": 0, "items": []})
+
+    assert final_state["step_index"] == 3
+    assert len(final_state["items"]) == 3
+    assert [row["superstep"] for row in report] == [0, 1, 2, 3]
+    sizes = [row["state_bytes"] for row in report]
+    assert sizes == sorted(sizes) and sizes[-1] > sizes[0]
+    assert all({"net_bytes", "peak_bytes"} <= row.keys() for row in report)